@@ -1,24 +1,87 @@
-import os, json, hashlib
+import os, json, hashlib, asyncio, tempfile
+from collections import OrderedDict
+from functools import lru_cache
+try:
+    import orjson
+    def _json_dumps(data):
+        return orjson.dumps(data)
+    _json_loads = orjson.loads
+except ImportError:
+    def _json_dumps(data):
+        return json.dumps(data).encode("utf-8")
+    _json_loads = json.loads
 CACHE_DIR = os.getenv("CACHE_DIR","./cache")
+CACHE_MEM_SIZE = int(os.getenv("CACHE_MEM_SIZE","512"))
 os.makedirs(CACHE_DIR, exist_ok=True)
 
+@lru_cache(maxsize=1024)
+def _prompt_key(prompt: str, cache_dir: str) -> str:
+    # memoized so a get() followed by set() for the same prompt hashes it only once;
+    # blake2b-128 is plenty for a filename namespace, "v2_" separates it from old sha256 entries
+    h = hashlib.blake2b(prompt.encode("utf-8"), digest_size=16).hexdigest()
+    return os.path.join(cache_dir, "v2_" + h + ".json")
+
 class PromptCache:
-    def __init__(self):
+    def __init__(self, mem_size: int = CACHE_MEM_SIZE):
         self.dir = CACHE_DIR
+        # in-process LRU in front of the file cache, keyed by entry path
+        self.mem_size = mem_size
+        self._mem = OrderedDict()
 
     def _key(self, prompt: str):
-        h = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
-        return os.path.join(self.dir, h + ".json")
+        return _prompt_key(prompt, self.dir)
+
+    def _remember(self, path: str, data):
+        self._mem[path] = data
+        self._mem.move_to_end(path)
+        while len(self._mem) > self.mem_size:
+            self._mem.popitem(last=False)
 
     def get(self, prompt: str):
         path = self._key(prompt)
-        if os.path.exists(path):
-            with open(path,"r",encoding="utf-8") as f:
-                return json.load(f)
-        return None
+        if path in self._mem:
+            self._mem.move_to_end(path)
+            return self._mem[path]
+        # single open attempt instead of exists()+open()
+        try:
+            with open(path,"rb") as f:
+                data = _json_loads(f.read())
+        except FileNotFoundError:
+            return None
+        self._remember(path, data)
+        return data
+
+    def _write(self, path: str, payload: bytes):
+        # payload is serialized up front and written to a temp file, then renamed into place,
+        # so readers (in this or other processes) never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            try:
+                os.fchmod(fd, 0o644)
+                view = memoryview(payload)
+                while view:
+                    view = view[os.write(fd, view):]
+            finally:
+                os.close(fd)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except FileNotFoundError:
+                pass
+            raise
 
     def set(self, prompt: str, data):
         path = self._key(prompt)
-        with open(path,"w",encoding="utf-8") as f:
-            json.dump(data,f)
+        self._remember(path, data)
+        self._write(path, _json_dumps(data))
+        return path
+
+    async def aset(self, prompt: str, data):
+        """
+        Like set(), but the disk write runs off the event loop; the memory layer is updated immediately.
+        """
+        path = self._key(prompt)
+        self._remember(path, data)
+        await asyncio.to_thread(self._write, path, _json_dumps(data))
         return path
@@ -1,51 +1,184 @@
 # image_client.py
+import io
 import os
 import uuid
 import base64
+import asyncio
+from contextlib import asynccontextmanager
 from pathlib import Path
 from PIL import Image
 
+try:
+    import aiohttp
+    AIOHTTP_AVAILABLE = True
+except Exception:
+    aiohttp = None
+    AIOHTTP_AVAILABLE = False
+
+try:
+    from tenacity import retry, retry_if_exception, stop_after_attempt, wait_exponential_jitter
+    TENACITY_AVAILABLE = True
+except Exception:
+    TENACITY_AVAILABLE = False
+
 OUT = os.getenv("OUT_DIR", "./outputs")
 Path(OUT).mkdir(parents=True, exist_ok=True)
+OPENAI_IMAGES_URL = os.getenv("OPENAI_IMAGES_URL", "https://api.openai.com/v1/images/generations")
+HTTP_POOL_LIMIT = int(os.getenv("HTTP_POOL_LIMIT", "32"))
 
-def _write_bytes_to_png(b: bytes):
+def new_http_session():
+    """aiohttp session with the keepalive connector pool used for provider calls."""
+    return aiohttp.ClientSession(connector=aiohttp.TCPConnector(limit=HTTP_POOL_LIMIT))
+
+def _is_rate_limited(exc: BaseException):
+    # aiohttp.ClientResponseError exposes .status, openai.APIStatusError exposes .status_code
+    return getattr(exc, "status", None) == 429 or getattr(exc, "status_code", None) == 429
+
+if TENACITY_AVAILABLE:
+    # exponential backoff with jitter on 429s only; other errors go straight to the fallbacks
+    _retry_on_rate_limit = retry(
+        retry=retry_if_exception(_is_rate_limited),
+        wait=wait_exponential_jitter(initial=1, max=30),
+        stop=stop_after_attempt(int(os.getenv("IMG_MAX_RETRIES", "5"))),
+        reraise=True,
+    )
+else:
+    def _retry_on_rate_limit(fn):
+        return fn
+
+# write buffer for image files, and base64 slice size (multiple of 4 so each slice decodes on its own)
+WRITE_BUFFER = 1024 * 1024
+B64_CHUNK = 64 * 1024
+
+def _render_placeholder():
+    buf = io.BytesIO()
+    Image.new("RGB", (1024, 1024), (255, 80, 80)).save(buf, format="PNG")
+    return buf.getvalue()
+
+# placeholder PNG is encoded once at import and reused for every fallback
+_PLACEHOLDER_BYTES = _render_placeholder()
+
+def _new_png_path():
     filename = f"{uuid.uuid4().hex[:12]}.png"
-    path = os.path.join(OUT, filename)
+    return os.path.join(OUT, filename)
+
+def _write_bytes_to_png(b: bytes):
+    path = _new_png_path()
     with open(path, "wb") as f:
         f.write(b)
     return path
 
+def _discard(path: str):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+def _write_b64_to_png(b64: str):
+    # decode slice by slice into a buffered temp file instead of materializing the whole image first;
+    # renamed into place only once complete
+    path = _new_png_path()
+    tmp = path + ".part"
+    try:
+        with open(tmp, "wb", buffering=WRITE_BUFFER) as f:
+            for i in range(0, len(b64), B64_CHUNK):
+                f.write(base64.b64decode(b64[i:i + B64_CHUNK]))
+        os.replace(tmp, path)
+    except BaseException:
+        _discard(tmp)
+        raise
+    return path
+
 class ImageClient:
-    def __init__(self):
+    def __init__(self, session=None):
         # provider string: "openai" or "placeholder" (default)
         self.provider = os.getenv("IMAGE_PROVIDER", "placeholder").lower()
         # optional: you may have OPENAI_API_KEY in env
         self.openai_key = os.getenv("OPENAI_API_KEY") or os.getenv("OPENAI_API_KEY")
+        # shared keepalive HTTP session (bound by the app lifespan) and SDK client are reused across calls
+        self._session = session
+        self._client = None
+
+    def bind_session(self, session):
+        """Use a shared aiohttp session (owned and closed by the caller, e.g. the app lifespan)."""
+        self._session = session
+
+    @asynccontextmanager
+    async def _session_scope(self):
+        # outside the lifespan (tests, scripts) no session is bound: use one scoped to this call,
+        # so nothing outlives the event loop it was created on
+        if self._session is not None and not self._session.closed:
+            yield self._session
+        else:
+            async with new_http_session() as session:
+                yield session
+
+    def _get_client(self):
+        if self._client is None:
+            from openai import OpenAI
+            self._client = OpenAI(api_key=self.openai_key) if self.openai_key else OpenAI()
+        return self._client
+
+    @_retry_on_rate_limit
+    async def _generate(self, prompt: str):
+        """Return (b64, url) for the first generated image; either may be None."""
+        payload = {"model": "gpt-image-1", "prompt": prompt, "n": 1, "size": "1024x1024"}
+        if AIOHTTP_AVAILABLE and self.openai_key:
+            # POST straight to the images endpoint over the pooled keepalive session
+            headers = {"Authorization": f"Bearer {self.openai_key}"}
+            async with self._session_scope() as session:
+                async with session.post(OPENAI_IMAGES_URL, json=payload, headers=headers) as resp:
+                    resp.raise_for_status()
+                    body = await resp.json()
+            data0 = body["data"][0]
+            return data0.get("b64_json"), data0.get("url")
+        # new client: images.generate (sync SDK, keep it off the event loop)
+        resp = await asyncio.to_thread(self._get_client().images.generate, **payload)
+        return getattr(resp.data[0], "b64_json", None), getattr(resp.data[0], "url", None)
+
+    async def _stream_to_png(self, chunks):
+        # file IO runs off the event loop; a failed download leaves no partial .png behind
+        path = _new_png_path()
+        tmp = path + ".part"
+        try:
+            f = await asyncio.to_thread(open, tmp, "wb", WRITE_BUFFER)
+            try:
+                async for chunk in chunks:
+                    await asyncio.to_thread(f.write, chunk)
+            finally:
+                await asyncio.to_thread(f.close)
+            os.replace(tmp, path)
+        except BaseException:
+            _discard(tmp)
+            raise
+        return path
+
+    async def _download_to_png(self, url: str):
+        if not AIOHTTP_AVAILABLE:
+            raise RuntimeError("aiohttp is required to download image URLs.")
+        async with self._session_scope() as session:
+            async with session.get(url) as resp:
+                resp.raise_for_status()
+                return await self._stream_to_png(resp.content.iter_chunked(64 * 1024))
+
+    async def _save_image(self, b64, url):
+        if b64:
+            return await asyncio.to_thread(_write_b64_to_png, b64)
+        if url:
+            return await self._download_to_png(url)
+        raise RuntimeError("OpenAI response missing image data.")
 
     async def generate_image(self, prompt: str):
         """
         Return dict {path, url, prompt}
-        Tries OpenAI (new client), falls back to legacy openai.Image.create,
+        Tries OpenAI (pooled aiohttp session or new client), falls back to legacy openai.Image.create,
         otherwise returns a placeholder image.
         """
         if self.provider == "openai":
-            # Try new OpenAI client first (OpenAI())
+            # Try the images endpoint first (aiohttp session, or new OpenAI() client)
             try:
-                # try new client
-                from openai import OpenAI
-                client = OpenAI(api_key=self.openai_key) if self.openai_key else OpenAI()
-                # new client: images.generate
-                resp = client.images.generate(model="gpt-image-1", prompt=prompt, n=1, size="1024x1024")
-                # resp.data[0].b64_json
-                try:
-                    b64 = resp.data[0].b64_json
-                except Exception:
-                    # some versions may expose differently
-                    b64 = getattr(resp.data[0], "b64_json", None)
-                if not b64:
-                    raise RuntimeError("OpenAI response missing base64 image data (new client).")
-                img_bytes = base64.b64decode(b64)
-                path = _write_bytes_to_png(img_bytes)
+                b64, url = await self._generate(prompt)
+                path = await self._save_image(b64, url)
                 return {"path": path, "url": f"file://{os.path.abspath(path)}", "prompt": prompt}
             except Exception as e_new:
                 # print helpful error and fall back to legacy client
@@ -60,12 +193,8 @@ class ImageClient:
                 # older SDKs put base64 in resp['data'][0]['b64_json'] or ['b64']
                 data0 = resp['data'][0]
                 b64 = data0.get('b64_json') or data0.get('b64') or data0.get('b64_url')
-                if not b64:
-                    # if provider returned a url instead of base64, attempt to use that url
-                    # but for now treat as error
-                    raise RuntimeError("OpenAI (legacy) returned no base64 image data.")
-                img_bytes = base64.b64decode(b64)
-                path = _write_bytes_to_png(img_bytes)
+                # if provider returned a url instead of base64, stream it to disk
+                path = await self._save_image(b64, data0.get('url'))
                 return {"path": path, "url": f"file://{os.path.abspath(path)}", "prompt": prompt}
             except Exception as e_legacy:
                 print("OpenAI (legacy) image generation failed:", type(e_legacy).__name__, str(e_legacy)[:300])
@@ -73,10 +202,7 @@ class ImageClient:
 
         # Placeholder fallback (safe offline demo)
         try:
-            fname = f"{uuid.uuid4().hex[:12]}.png"
-            path = os.path.join(OUT, fname)
-            img = Image.new("RGB", (1024, 1024), (255, 80, 80))
-            img.save(path)
+            path = _write_bytes_to_png(_PLACEHOLDER_BYTES)
             return {"path": path, "url": f"file://{os.path.abspath(path)}", "prompt": prompt}
         except Exception as e:
             # Last-ditch fallback: return a path-like string but don't crash
@@ -1,53 +1,83 @@
 """
 LangChain-based OrchestratorAgent
 
-This module uses LangChain to construct two chains:
- - copy_chain: generates headlines and long copies
+This module uses LangChain (LCEL runnables over ChatOpenAI) to construct the chains:
+ - headline_chain / long_chain: generate headlines and long copies
  - prompt_chain: converts a given copy into an image prompt
 
 The OrchestratorAgent.run method executes:
- 1. copy_chain -> headlines + long copies
- 2. prompt_chain (for each copy) -> image prompts
- 3. uses image_client to generate images (async)
- 4. scores copy-image pairs via scorer
+ 1. headline_chain + long_chain (concurrently, via ainvoke) -> headlines + long copies
+ 2. prompt_chain (for each copy, concurrently) -> image prompts
+ 3. uses image_client to generate images (async, bounded by IMG_CONCURRENCY)
+ 4. scores all copy-image pairs via scorer (batched embeddings)
 
 Notes:
- - Requires environment OPENAI_API_KEY for LangChain's OpenAI LLM wrapper.
+ - Requires langchain-openai and environment OPENAI_API_KEY for the ChatOpenAI wrapper.
  - If LangChain is not installed or fails, falls back to the simple orchestrator implementation.
 """
 
-import os, asyncio, logging
+import os, asyncio, json, logging, weakref
+import numpy as np
 from typing import List, Dict, Any
 
 logger = logging.getLogger("orchestrator.langchain")
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
 try:
     # LangChain imports
-    from langchain import OpenAI
-    from langchain.prompts import PromptTemplate
-    from langchain.chains import LLMChain, SimpleSequentialChain
+    from langchain_openai import ChatOpenAI
+    from langchain_core.prompts import PromptTemplate
+    from langchain_core.output_parsers import StrOutputParser
     LANGCHAIN_AVAILABLE = True
 except Exception as e:
     LANGCHAIN_AVAILABLE = False
     logger.warning("LangChain not available: %s", e)
 
+def _top_k_flat(scores: np.ndarray, k: int) -> np.ndarray:
+    """
+    Flat indices of the k highest entries of scores, best first, without sorting the whole matrix.
+    Ties (e.g. neutral fallback scores) are broken by flat index, i.e. copy-major order.
+    """
+    neg = -scores.ravel()
+    k = min(k, neg.size)
+    if k == 0:
+        return np.arange(0)
+    # k-th best value; everything strictly better is in, ties at the boundary are taken in flat order
+    t = np.partition(neg, k - 1)[k - 1]
+    better = np.flatnonzero(neg < t)
+    tied = np.flatnonzero(neg == t)[:k - better.size]
+    cand = np.concatenate([better, tied])
+    return cand[np.lexsort((cand, neg[cand]))]
+
 class OrchestratorAgent:
-    def __init__(self, llm, image_client, scorer, cache):
+    def __init__(self, llm, image_client, scorer, cache, llm_executor=None):
         """
         llm: existing LLMClient (fallback) but we'll also create LangChain LLM if available
         image_client: async image generator
         scorer: CoherenceScorer instance
         cache: PromptCache instance
+        llm_executor: bounded thread pool for synchronous LLM calls (None -> event loop default pool)
         """
         self.llm = llm
         self.image_client = image_client
         self.scorer = scorer
         self.cache = cache
+        # caps concurrent image generations across requests (provider rate limits)
+        # (one per event loop, created lazily: the agent is built at import, outside any loop)
+        self.img_concurrency = int(os.getenv("IMG_CONCURRENCY","5"))
+        self._img_sems = weakref.WeakKeyDictionary()
+        # dedicated bounded pool for synchronous LLM calls, so they can't crowd out the default pool
+        self.llm_executor = llm_executor
 
         if LANGCHAIN_AVAILABLE:
-            # Create a LangChain OpenAI LLM wrapper using environment key
+            # Create a LangChain chat model (async-capable) using environment key
             openai_api_key = os.getenv("OPENAI_API_KEY")
-            self.lc_llm = OpenAI(model_name=os.getenv("OPENAI_CHAT_MODEL","gpt-4o-mini"), openai_api_key=openai_api_key, temperature=0.8)
+            self.lc_llm = ChatOpenAI(model=os.getenv("OPENAI_CHAT_MODEL","gpt-4o-mini"), api_key=openai_api_key, temperature=0.8)
             # Define prompt templates
             self.headline_prompt = PromptTemplate(
                 input_variables=["product","audience","tone","num_headlines"],
@@ -69,47 +99,50 @@ class OrchestratorAgent:
                           "Product: {product}\nAudience: {audience}\nTone: {tone}\nPlatform: {platform}\nCopy: {copy}\n\n"
                           "Describe the scene, visual style, colors, mood, camera angle, and any props. Keep under 2 sentences.")
             )
-            # Chains
-            self.headline_chain = LLMChain(llm=self.lc_llm, prompt=self.headline_prompt, verbose=False, output_key="headlines_raw")
-            self.long_chain = LLMChain(llm=self.lc_llm, prompt=self.long_prompt, verbose=False, output_key="long_raw")
-            self.prompt_chain = LLMChain(llm=self.lc_llm, prompt=self.prompt_from_copy_template, verbose=False, output_key="image_prompt")
+            # Chains (prompt | llm | str) so ainvoke returns the raw text
+            self.headline_chain = self.headline_prompt | self.lc_llm | StrOutputParser()
+            self.long_chain = self.long_prompt | self.lc_llm | StrOutputParser()
+            self.prompt_chain = self.prompt_from_copy_template | self.lc_llm | StrOutputParser()
         else:
             logger.info("LangChain not available; OrchestratorAgent will use fallback llm client.")
 
+    def _img_semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        sem = self._img_sems.get(loop)
+        if sem is None:
+            sem = self._img_sems[loop] = asyncio.Semaphore(self.img_concurrency)
+        return sem
+
     async def run(self, brief: Dict[str,Any]) -> Dict[str,Any]:
         """
         Orchestrates the full pipeline and returns top assets.
         """
+        # caps concurrent LLM prompt calls for this run
+        sem = asyncio.Semaphore(int(os.getenv("LLM_CONCURRENCY","5")))
+
         if LANGCHAIN_AVAILABLE:
-            # Run headline and long copy generation using LangChain in thread
+            # Run headline and long copy generation using LangChain's native async API
             product = brief.get("product")
             audience = brief.get("audience")
             tone = brief.get("tone")
             num_headlines = int(brief.get("num_headlines",5))
             num_long = int(brief.get("num_long",3))
 
-            # LangChain LLMChain runs synchronously; run in thread to avoid blocking event loop
-            def run_headlines():
-                out = self.headline_chain.run({"product":product,"audience":audience,"tone":tone,"num_headlines":num_headlines})
-                return out
-            def run_long():
-                out = self.long_chain.run({"product":product,"audience":audience,"tone":tone,"num_long":num_long})
-                return out
-
-            raw_headlines = await asyncio.to_thread(run_headlines)
-            raw_long = await asyncio.to_thread(run_long)
+            raw_headlines, raw_long = await asyncio.gather(
+                self.headline_chain.ainvoke({"product":product,"audience":audience,"tone":tone,"num_headlines":num_headlines}),
+                self.long_chain.ainvoke({"product":product,"audience":audience,"tone":tone,"num_long":num_long}),
+            )
 
             # Attempt to eval JSON arrays; fallback to line splitting
             try:
-                import json
-                headlines = json.loads(raw_headlines)
+                headlines = _json_loads(raw_headlines)
                 if not isinstance(headlines, list):
                     raise ValueError("headlines not list")
             except Exception:
                 headlines = [line.strip("- ").strip() for line in raw_headlines.splitlines() if line.strip()]
 
             try:
-                long_copies = json.loads(raw_long)
+                long_copies = _json_loads(raw_long)
                 if not isinstance(long_copies, list):
                     raise ValueError("long not list")
             except Exception:
@@ -117,17 +150,17 @@ class OrchestratorAgent:
 
             copies = headlines + long_copies
 
-            # Generate prompts for each copy using prompt_chain
-            prompts = []
-            for c in copies:
-                def run_prompt():
-                    return self.prompt_chain.run({"product":product,"audience":audience,"tone":tone,"copy":c,"platform":",".join(brief.get("platform",[]))})
-                p = await asyncio.to_thread(run_prompt)
-                prompts.append(p)
+            # Generate prompts for each copy using prompt_chain (concurrently, bounded by sem)
+            platform = ",".join(brief.get("platform",[]))
+            async def run_prompt(c):
+                async with sem:
+                    return await self.prompt_chain.ainvoke({"product":product,"audience":audience,"tone":tone,"copy":c,"platform":platform})
+            prompts = await asyncio.gather(*(run_prompt(c) for c in copies))
 
         else:
-            # Fallback to existing llm client methods
-            headlines, long_copies = self.llm.generate_copy_variations(brief)
+            # Fallback to existing (synchronous) llm client methods, run on the LLM pool
+            loop = asyncio.get_running_loop()
+            headlines, long_copies = await loop.run_in_executor(self.llm_executor, self.llm.generate_copy_variations, brief)
             copies = headlines + long_copies
             prompts = self.llm.generate_image_prompts(brief, copies)
 
@@ -137,18 +170,20 @@ class OrchestratorAgent:
             cached = self.cache.get(p)
             if cached:
                 return cached
-            img = await self.image_client.generate_image(p)
-            self.cache.set(p, img)
+            async with self._img_semaphore():
+                img = await self.image_client.generate_image(p)
+            await self.cache.aset(p, img)
             return img
 
-        tasks = [gen_prompt(p) for p in prompts]
-        images = await asyncio.gather(*tasks)
-
-        # 4. Score copy-image pairs
-        results = []
-        for copy in copies:
-            for img in images:
-                s = self.scorer.score(copy, img["path"])
-                results.append({"copy": copy, "image_url": img["url"], "local_path": img["path"], "score": s})
-        top = sorted(results, key=lambda x: x["score"], reverse=True)[:6]
+        # identical prompts (e.g. from the fallback llm client) only hit the image API once
+        unique_prompts = list(dict.fromkeys(prompts))
+        images = await asyncio.gather(*(gen_prompt(p) for p in unique_prompts))
+
+        # 4. Score copy-image pairs (batched embeddings, one similarity matrix)
+        scores = np.asarray(await self.scorer.ascore_matrix(copies, [img["path"] for img in images]))
+        order = _top_k_flat(scores, 6)
+        top = []
+        for i, j in zip(*np.unravel_index(order, scores.shape)):
+            img = images[j]
+            top.append({"copy": copies[i], "image_url": img["url"], "local_path": img["path"], "score": float(scores[i, j])})
         return {"top_assets": top}
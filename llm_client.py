@@ -1,8 +1,18 @@
 # llm_client.py
 import os
+import re
 import json
 from typing import List, Dict, Any
 
+try:
+    import orjson
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# first {...} block in a chat response (e.g. JSON wrapped in markdown)
+_JSON_BLOCK = re.compile(r"(\{[\s\S]*\})")
+
 # Try to use legacy openai package for chat calls (most common local setups)
 def _has_openai_key():
     return bool(os.getenv("OPENAI_API_KEY"))
@@ -56,13 +66,12 @@ class LLMClient:
                 text = resp["choices"][0]["message"]["content"]
                 # Try to extract JSON from text (in case assistant wraps in markdown)
                 try:
-                    j = json.loads(text.strip())
+                    j = _json_loads(text.strip())
                 except Exception:
                     # attempt to find first JSON object in the response
-                    import re
-                    m = re.search(r"(\{[\s\S]*\})", text)
+                    m = _JSON_BLOCK.search(text)
                     if m:
-                        j = json.loads(m.group(1))
+                        j = _json_loads(m.group(1))
                     else:
                         raise
 
@@ -1,12 +1,14 @@
 import os
 import asyncio
 import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, HTTPException
 from pydantic import BaseModel
 from typing import List, Dict, Any
 from llm_client import LLMClient
-from image_client import ImageClient
-from scorer import CoherenceScorer
+from image_client import ImageClient, AIOHTTP_AVAILABLE, new_http_session
+from scorer import CoherenceScorer, clip_model
 from storage import SanityStorage
 from cache import PromptCache
 from report import ReportGenerator
@@ -16,7 +18,36 @@ from langchain_agent import OrchestratorAgent
 logging.basicConfig(level=os.getenv("LOG_LEVEL","INFO"))
 logger = logging.getLogger("campaign-generator")
 
-app = FastAPI(title="Multi-Modal Campaign Asset Generator")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # shared HTTP session and worker pool are created once per process and handed to the clients
+    app.state.executor = ThreadPoolExecutor(max_workers=int(os.getenv("WORKER_THREADS","16")), thread_name_prefix="worker")
+    scorer.executor = app.state.executor
+    app.state.preprocess_executor = None
+    if clip_model is not None:
+        app.state.preprocess_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CLIP_PREPROCESS_WORKERS","4")), thread_name_prefix="clip-prep")
+        scorer.preprocess_executor = app.state.preprocess_executor
+    app.state.llm_executor = ThreadPoolExecutor(max_workers=int(os.getenv("LC_POOL","8")), thread_name_prefix="lc")
+    agent.llm_executor = app.state.llm_executor
+    app.state.http = None
+    if AIOHTTP_AVAILABLE:
+        app.state.http = new_http_session()
+        image_client.bind_session(app.state.http)
+    try:
+        yield
+    finally:
+        # release pooled HTTP connections and worker threads on shutdown
+        if app.state.http is not None:
+            await app.state.http.close()
+        scorer.executor = None
+        app.state.executor.shutdown(wait=False)
+        if app.state.preprocess_executor is not None:
+            scorer.preprocess_executor = None
+            app.state.preprocess_executor.shutdown(wait=False)
+        agent.llm_executor = None
+        app.state.llm_executor.shutdown(wait=False)
+
+app = FastAPI(title="Multi-Modal Campaign Asset Generator", lifespan=lifespan)
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 if not OPENAI_API_KEY:
@@ -73,7 +104,7 @@ async def generate(brief: Brief):
                 })
 
         # produce report CSV/PDF
-        report_path = reporter.generate_report(brief.dict(), top)
+        report_path = await reporter.generate_report(brief.dict(), top)
         logger.info("Report generated at %s", report_path)
 
         return {"top_assets": top, "report": report_path}
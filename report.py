@@ -1,36 +1,47 @@
-import csv, os
+import csv, os, io, asyncio
 from reportlab.lib.pagesizes import letter
-from reportlab.pdfgen import canvas
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer
+from xml.sax.saxutils import escape
 from datetime import datetime
 
 OUT = os.getenv("OUT_DIR","./outputs")
 os.makedirs(OUT, exist_ok=True)
+WRITE_BUFFER = 1024 * 1024
 
 class ReportGenerator:
     def __init__(self):
         pass
 
-    def generate_report(self, brief: dict, assets: list):
+    async def generate_report(self, brief: dict, assets: list):
         ts = datetime.utcnow().strftime("%Y%m%dT%H%M%SZ")
         csv_path = os.path.join(OUT, f"report_{ts}.csv")
         pdf_path = os.path.join(OUT, f"report_{ts}.pdf")
-        # write csv
-        with open(csv_path,"w",newline="",encoding="utf-8") as f:
-            writer = csv.writer(f)
-            writer.writerow(["product","copy","image_url","score"])
-            for a in assets:
-                writer.writerow([brief.get("product"), a["copy"], a["image_url"], a["score"]])
-        # write simple pdf
-        c = canvas.Canvas(pdf_path, pagesize=letter)
-        c.setFont("Helvetica", 12)
-        c.drawString(40, 750, f"Campaign Report for {brief.get('product')} - {ts}")
-        y = 720
-        for a in assets:
-            text = f"Score: {a['score']:.3f} | Copy: {a['copy']}"
-            c.drawString(40, y, text)
-            y -= 40
-            if y < 100:
-                c.showPage()
-                y = 750
-        c.save()
+        # csv and pdf are independent; write them concurrently off the event loop
+        await asyncio.gather(
+            asyncio.to_thread(self._write_csv, csv_path, brief, assets),
+            asyncio.to_thread(self._write_pdf, pdf_path, brief, assets, ts),
+        )
         return {"csv": csv_path, "pdf": pdf_path}
+
+    def _write_csv(self, csv_path: str, brief: dict, assets: list):
+        # build in memory, then a single write
+        buf = io.StringIO()
+        writer = csv.writer(buf)
+        writer.writerow(["product","copy","image_url","score"])
+        for a in assets:
+            writer.writerow([brief.get("product"), a["copy"], a["image_url"], a["score"]])
+        with open(csv_path,"wb",buffering=WRITE_BUFFER) as f:
+            f.write(buf.getvalue().encode("utf-8"))
+
+    def _write_pdf(self, pdf_path: str, brief: dict, assets: list, ts: str):
+        # lay out the whole report in one platypus pass into memory, then a single write
+        styles = getSampleStyleSheet()
+        story = [Paragraph(escape(f"Campaign Report for {brief.get('product')} - {ts}"), styles["Title"]), Spacer(1, 12)]
+        for a in assets:
+            story.append(Paragraph(escape(f"Score: {a['score']:.3f} | Copy: {a['copy']}"), styles["Normal"]))
+            story.append(Spacer(1, 12))
+        buf = io.BytesIO()
+        SimpleDocTemplate(buf, pagesize=letter).build(story)
+        with open(pdf_path,"wb",buffering=WRITE_BUFFER) as f:
+            f.write(buf.getvalue())
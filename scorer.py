@@ -1,12 +1,21 @@
 # scorer.py
 import os
+import asyncio
+import logging
 import numpy as np
-from typing import Optional
+from typing import Dict, List, Optional, Tuple
 from PIL import Image
 import openai
 
+logger = logging.getLogger("scorer")
+
 USE_CLIP = os.getenv("USE_CLIP", "true").lower() in ("1", "true", "yes")
 CLIP_DEVICE = os.getenv("CLIP_DEVICE", "cpu")
+# reduced-precision CLIP inference: on cuda clip.load already returns fp16 weights, CLIP_AMP=false
+# converts them back to fp32; bf16 autocast on cpu is opt-in, it only pays off on CPUs with
+# native BF16 (AVX512-BF16 / AMX) and is slower than fp32 elsewhere
+CLIP_AMP = os.getenv("CLIP_AMP", "true").lower() in ("1", "true", "yes")
+CLIP_CPU_BF16 = os.getenv("CLIP_CPU_BF16", "false").lower() in ("1", "true", "yes")
 
 # Try to load CLIP model if requested
 try:
@@ -15,67 +24,197 @@ try:
         import clip
         device = CLIP_DEVICE if (torch.cuda.is_available() and CLIP_DEVICE == "cuda") else "cpu"
         clip_model, clip_preprocess = clip.load("ViT-B/32", device=device)
+        if device == "cuda" and not CLIP_AMP:
+            clip_model = clip_model.float()
     else:
         clip_model = None
         clip_preprocess = None
 except Exception as e:
     clip_model = None
     clip_preprocess = None
-    print("CLIP not available:", type(e).__name__, str(e)[:200])
+    logger.warning("CLIP not available: %s %s", type(e).__name__, str(e)[:200])
+
+def _clip_autocast(model_device):
+    import torch
+    if model_device.type == "cuda":
+        return torch.autocast("cuda", dtype=torch.float16, enabled=CLIP_AMP)
+    return torch.autocast("cpu", dtype=torch.bfloat16, enabled=CLIP_CPU_BF16)
+
+def _load_and_preprocess(image_path: str):
+    # None for unreadable images (e.g. "" from the image client's last-ditch fallback, or a deleted file)
+    try:
+        return clip_preprocess(Image.open(image_path).convert("RGB"))
+    except Exception as e:
+        logger.warning("Scorer could not load image %r: %s %s", image_path, type(e).__name__, str(e)[:200])
+        return None
 
 class CoherenceScorer:
-    def __init__(self, openai_api_key: Optional[str] = None):
+    def __init__(self, openai_api_key: Optional[str] = None, executor=None, preprocess_executor=None):
+        # thread pool for blocking embedding / CLIP work (None -> event loop default pool)
+        self.executor = executor
+        # separate pool for PIL decode + clip_preprocess (PIL releases the GIL while decoding);
+        # kept apart from self.executor so score_matrix running there can't deadlock. None -> inline
+        self.preprocess_executor = preprocess_executor
         # set openai key if provided
         key = openai_api_key or os.getenv("OPENAI_API_KEY")
         if key:
             openai.api_key = key
 
     def _text_embedding(self, text: str):
-        # Use OpenAI embeddings (fallback) if available
+        return self.embed_texts([text])[0].astype(float)
+
+    def _score_text_embeddings(self, texts: List[str]) -> np.ndarray:
+        # texts must share the image embedding space: CLIP text encoder when CLIP scores the images
+        if clip_model is not None:
+            return self.encode_texts(texts)
+        return self.embed_texts(texts)
+
+    def _hash_embedding(self, text: str):
+        # produce a simple random-ish vector (deterministic via hash) to avoid crashes
+        import hashlib
+        h = hashlib.sha256(text.encode("utf-8")).digest()
+        arr = np.frombuffer(h, dtype=np.uint8).astype(float)
+        # pad/trim to 1536 if needed (common embedding size)
+        if arr.size < 1536:
+            arr = np.pad(arr, (0, 1536 - arr.size), mode="constant", constant_values=0)
+        return arr.astype(float)
+
+    def embed_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed texts with a single batched OpenAI request; returns an L2-normalized (N, D) float32 matrix.
+        Duplicate texts are only sent once.
+        """
+        unique = list(dict.fromkeys(texts))
+        if not unique:
+            return np.zeros((0, 1536), dtype=np.float32)
         try:
             model = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-small")
-            resp = openai.Embedding.create(model=model, input=text)
-            return np.array(resp["data"][0]["embedding"], dtype=float)
+            if hasattr(openai, "embeddings"):
+                # openai>=1.0 module-level client
+                resp = openai.embeddings.create(model=model, input=unique)
+                vecs = [d.embedding for d in resp.data]
+            else:
+                resp = openai.Embedding.create(model=model, input=unique)
+                vecs = [d["embedding"] for d in resp["data"]]
+        except Exception:
+            # fallback: deterministic hash vectors
+            vecs = [self._hash_embedding(t) for t in unique]
+        embs = np.asarray(vecs, dtype=np.float32)
+        # normalize once here so every downstream dot product is already a cosine
+        embs /= np.linalg.norm(embs, axis=1, keepdims=True) + 1e-12
+        by_text: Dict[str, np.ndarray] = dict(zip(unique, embs))
+        return np.stack([by_text[t] for t in texts])
+
+    def embed_images(self, image_paths: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return (embeddings, ok): an L2-normalized (M, D) float32 matrix of image embeddings
+        (CLIP, or caption embeddings as fallback) and a boolean mask of the images that could be embedded.
+        """
+        if clip_model is not None:
+            embs, ok = self.encode_images(image_paths)
+            return embs.astype(np.float32), ok
+        captions = [self._caption_image_via_llm(p) for p in image_paths]
+        return self.embed_texts(captions), np.ones(len(image_paths), dtype=bool)
+
+    def score_matrix(self, texts: List[str], image_paths: List[str]) -> np.ndarray:
+        """
+        Return an (N, M) matrix of coherence scores in [0,1] for every text/image pair.
+        """
+        try:
+            text_embs = self._score_text_embeddings(texts)
+            img_embs, ok = self.embed_images(image_paths)
+            if text_embs.shape[1] != img_embs.shape[1]:
+                logger.warning("Scorer embedding size mismatch: text %s vs image %s; using neutral scores",
+                               text_embs.shape, img_embs.shape)
+                return np.full((len(texts), len(image_paths)), 0.4)
+            # embeddings are pre-normalized: cosine similarity for all pairs, mapped from [-1,1] to [0,1]
+            sims = text_embs @ img_embs.T
+            scores = np.clip((sims + 1.0) / 2.0, 0.0, 1.0)
+            # images that failed to load only neutralize their own column
+            scores[:, ~ok] = 0.4
+            return scores
         except Exception as e:
-            # as fallback, produce a simple random-ish vector (deterministic via hash) to avoid crashes
-            import hashlib
-            h = hashlib.sha256(text.encode("utf-8")).digest()
-            arr = np.frombuffer(h, dtype=np.uint8).astype(float)
-            # pad/trim to 1536 if needed (common embedding size)
-            if arr.size < 1536:
-                arr = np.pad(arr, (0, 1536 - arr.size), mode="constant", constant_values=0)
-            return arr.astype(float)
+            # fallback neutral score
+            logger.warning("Scorer.exception: %s %s", type(e).__name__, str(e)[:200])
+            return np.full((len(texts), len(image_paths)), 0.4)
+
+    async def ascore_matrix(self, texts: List[str], image_paths: List[str]) -> np.ndarray:
+        """
+        score_matrix() run on self.executor so embedding requests and CLIP inference don't block the event loop.
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, self.score_matrix, texts, image_paths)
 
     def _image_embedding_clip(self, image_path: str):
+        embs, ok = self.encode_images([image_path])
+        if not ok[0]:
+            raise RuntimeError(f"could not load image {image_path!r}")
+        return embs[0]
+
+    def encode_texts(self, texts: List[str]) -> np.ndarray:
+        """
+        Encode texts with CLIP's text encoder in one batch; returns L2-normalized (N, D) float32 embeddings.
+        """
+        if clip_model is None:
+            raise RuntimeError("CLIP model not available")
+        import torch
+        import clip
+        model_device = clip_model.visual.conv1.weight.device
+        if not texts:
+            return np.zeros((0, clip_model.visual.output_dim), dtype=np.float32)
+        tokens = clip.tokenize(texts, truncate=True).to(model_device)
+        with _clip_autocast(model_device), torch.no_grad():
+            embs = clip_model.encode_text(tokens)
+        embs = embs.float()
+        embs = embs / (embs.norm(dim=1, keepdim=True) + 1e-10)
+        return embs.cpu().numpy()
+
+    def encode_images(self, image_paths: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Encode all loadable images with a single batched CLIP forward pass.
+        Returns (embeddings, ok): L2-normalized (M, D) embeddings (zero rows for images that failed to load)
+        and the boolean mask of images that loaded.
+        """
         if clip_model is None:
             raise RuntimeError("CLIP model not available")
-        image = Image.open(image_path).convert("RGB")
-        image_input = clip_preprocess(image).unsqueeze(0)
         import torch
-        with torch.no_grad():
-            emb = clip_model.encode_image(image_input.to(clip_model.visual.conv1.weight.device)).cpu().numpy()[0]
-        return emb / (np.linalg.norm(emb) + 1e-10)
+        if self.preprocess_executor is not None:
+            tensors = list(self.preprocess_executor.map(_load_and_preprocess, image_paths))
+        else:
+            tensors = [_load_and_preprocess(p) for p in image_paths]
+        ok = np.array([t is not None for t in tensors], dtype=bool)
+        out = np.zeros((len(image_paths), clip_model.visual.output_dim), dtype=np.float32)
+        if not ok.any():
+            return out, ok
+        model_device = clip_model.visual.conv1.weight.device
+        batch = torch.stack([t for t in tensors if t is not None]).to(model_device)
+        with _clip_autocast(model_device), torch.no_grad():
+            embs = clip_model.encode_image(batch)
+        # back to float32 before normalizing to keep cosine math stable
+        embs = embs.float()
+        embs = embs / (embs.norm(dim=1, keepdim=True) + 1e-10)
+        out[ok] = embs.cpu().numpy()
+        return out, ok
 
     def score(self, text: str, image_path: str) -> float:
         """
         Return a normalized score in [0,1] for coherence between text and image.
         """
         try:
-            text_emb = self._text_embedding(text)
+            text_emb = self._score_text_embeddings([text])[0]
             if clip_model is not None:
                 img_emb = self._image_embedding_clip(image_path)
             else:
                 # fallback: caption image via a simple placeholder caption (could be replaced with real captioning)
                 caption = self._caption_image_via_llm(image_path)
                 img_emb = self._text_embedding(caption)
-            # cosine similarity
-            denom = (np.linalg.norm(text_emb) * np.linalg.norm(img_emb) + 1e-12)
-            score = float(np.dot(text_emb, img_emb) / denom)
+            # cosine similarity (both embeddings are already unit length)
+            score = float(np.dot(text_emb, img_emb))
             # map from [-1,1] to [0,1]
             return max(0.0, min(1.0, (score + 1.0) / 2.0))
         except Exception as e:
             # fallback neutral score
-            print("Scorer.exception:", type(e).__name__, str(e)[:200])
+            logger.warning("Scorer.exception: %s %s", type(e).__name__, str(e)[:200])
             return 0.4
 
     def _caption_image_via_llm(self, image_path: str):
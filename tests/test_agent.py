@@ -0,0 +1,80 @@
+import asyncio
+import numpy as np
+import langchain_agent
+from langchain_agent import OrchestratorAgent
+
+# copy -> image prompt; "h1" and "h2" share a prompt
+PROMPTS = {"h1": "prompt-a", "h2": "prompt-a", "l1": "prompt-b"}
+
+class StubLLM:
+    def generate_copy_variations(self, brief):
+        return ["h1", "h2"], ["l1"]
+
+    def generate_image_prompts(self, brief, copies):
+        return [PROMPTS[c] for c in copies]
+
+class StubImageClient:
+    def __init__(self):
+        self.calls = []
+
+    async def generate_image(self, prompt):
+        self.calls.append(prompt)
+        return {"path": f"{prompt}.png", "url": f"file://{prompt}.png", "prompt": prompt}
+
+class StubScorer:
+    async def ascore_matrix(self, texts, image_paths):
+        # 1.0 only when the image was generated from the copy's own prompt
+        return np.array([[1.0 if p == f"{PROMPTS[t]}.png" else 0.0 for p in image_paths] for t in texts])
+
+class StubCache:
+    def get(self, prompt):
+        return None
+
+    async def aset(self, prompt, data):
+        return None
+
+def test_duplicate_prompts_generate_once(monkeypatch):
+    monkeypatch.setattr(langchain_agent, "LANGCHAIN_AVAILABLE", False)
+    images = StubImageClient()
+    agent = OrchestratorAgent(llm=StubLLM(), image_client=images, scorer=StubScorer(), cache=StubCache())
+    top = asyncio.run(agent.run({"product": "p"}))["top_assets"]
+    assert sorted(images.calls) == ["prompt-a", "prompt-b"]
+    assert [(a["copy"], a["local_path"], a["score"]) for a in top[:3]] == [
+        ("h1", "prompt-a.png", 1.0),
+        ("h2", "prompt-a.png", 1.0),
+        ("l1", "prompt-b.png", 1.0),
+    ]
+
+class NeutralScorer:
+    async def ascore_matrix(self, texts, image_paths):
+        return np.full((len(texts), len(image_paths)), 0.4)
+
+def test_tied_scores_keep_copy_major_order(monkeypatch):
+    monkeypatch.setattr(langchain_agent, "LANGCHAIN_AVAILABLE", False)
+    monkeypatch.setattr(StubLLM, "generate_copy_variations", lambda self, brief: (["h1", "h2", "h3", "h4"], []))
+    monkeypatch.setattr(StubLLM, "generate_image_prompts", lambda self, brief, copies: [f"prompt-{c}" for c in copies])
+    agent = OrchestratorAgent(llm=StubLLM(), image_client=StubImageClient(), scorer=NeutralScorer(), cache=StubCache())
+    top = asyncio.run(agent.run({"product": "p"}))["top_assets"]
+    # 4 copies x 4 images, all tied: the first six pairs in copy-major order
+    assert [(a["copy"], a["local_path"]) for a in top] == [
+        ("h1", "prompt-h1.png"), ("h1", "prompt-h2.png"), ("h1", "prompt-h3.png"), ("h1", "prompt-h4.png"),
+        ("h2", "prompt-h1.png"), ("h2", "prompt-h2.png"),
+    ]
+
+def test_top_k_flat_matches_stable_sort():
+    rng = np.random.default_rng(0)
+    scores = rng.integers(0, 4, size=(5, 7)).astype(float)
+    expected = np.argsort(-scores, axis=None, kind="stable")[:6]
+    assert langchain_agent._top_k_flat(scores, 6).tolist() == expected.tolist()
+
+class SlowImageClient(StubImageClient):
+    async def generate_image(self, prompt):
+        await asyncio.sleep(0.01)  # hold the semaphore so other prompts queue on it
+        return await super().generate_image(prompt)
+
+def test_image_semaphore_works_across_event_loops(monkeypatch):
+    monkeypatch.setattr(langchain_agent, "LANGCHAIN_AVAILABLE", False)
+    agent = OrchestratorAgent(llm=StubLLM(), image_client=SlowImageClient(), scorer=StubScorer(), cache=StubCache())
+    agent.img_concurrency = 1
+    for _ in range(2):
+        assert len(asyncio.run(agent.run({"product": "p"}))["top_assets"]) == 6
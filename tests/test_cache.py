@@ -0,0 +1,37 @@
+import asyncio
+import os
+from cache import PromptCache
+
+def make_cache(tmp_path, mem_size=2):
+    c = PromptCache(mem_size=mem_size)
+    c.dir = str(tmp_path)
+    return c
+
+def test_get_miss_then_set_then_memory_hit(tmp_path):
+    c = make_cache(tmp_path)
+    assert c.get("a") is None
+    path = c.set("a", {"path": "a.png"})
+    assert c.get("a") == {"path": "a.png"}
+    assert list(c._mem) == [path]
+
+def test_evicts_least_recently_used(tmp_path):
+    c = make_cache(tmp_path)
+    c.set("a", 1)
+    c.set("b", 2)
+    c.get("a")  # "a" is now most recent, so "b" goes first
+    c.set("c", 3)
+    assert list(c._mem) == [c._key("a"), c._key("c")]
+
+def test_disk_hit_repopulates_memory(tmp_path):
+    c = make_cache(tmp_path)
+    c.set("a", {"x": 1})
+    fresh = make_cache(tmp_path)
+    assert fresh._key("a") not in fresh._mem
+    assert fresh.get("a") == {"x": 1}
+    assert fresh._key("a") in fresh._mem
+
+def test_aset_round_trip(tmp_path):
+    c = make_cache(tmp_path)
+    path = asyncio.run(c.aset("a", {"path": "a.png", "url": "file://a.png"}))
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    assert make_cache(tmp_path).get("a") == {"path": "a.png", "url": "file://a.png"}
@@ -0,0 +1,35 @@
+import asyncio
+import base64
+import os
+import pytest
+import image_client
+from image_client import B64_CHUNK, ImageClient, _write_b64_to_png
+
+def test_write_b64_to_png_round_trip(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_client, "OUT", str(tmp_path))
+    raw = os.urandom(B64_CHUNK * 2 + 1234)
+    full = base64.b64encode(raw).decode("ascii")
+    assert len(full) > B64_CHUNK and len(full) % B64_CHUNK != 0
+    path = _write_b64_to_png(full)
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    with open(path, "rb") as f:
+        assert f.read() == base64.b64decode(full)
+
+async def _chunks(parts, fail=False):
+    for p in parts:
+        yield p
+    if fail:
+        raise ConnectionError("connection reset mid-stream")
+
+def test_stream_to_png_writes_all_chunks(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_client, "OUT", str(tmp_path))
+    path = asyncio.run(ImageClient()._stream_to_png(_chunks([b"abc", b"def"])))
+    assert os.listdir(tmp_path) == [os.path.basename(path)]
+    with open(path, "rb") as f:
+        assert f.read() == b"abcdef"
+
+def test_stream_to_png_failure_leaves_no_file(tmp_path, monkeypatch):
+    monkeypatch.setattr(image_client, "OUT", str(tmp_path))
+    with pytest.raises(ConnectionError):
+        asyncio.run(ImageClient()._stream_to_png(_chunks([b"abc"], fail=True)))
+    assert os.listdir(tmp_path) == []
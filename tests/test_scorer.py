@@ -0,0 +1,36 @@
+import numpy as np
+import openai
+import scorer
+from scorer import CoherenceScorer
+
+def _no_api(**kwargs):
+    raise RuntimeError("no network in tests")
+
+def make_scorer(monkeypatch):
+    # no CLIP, and embeddings fall back to the deterministic hash vectors
+    monkeypatch.setattr(scorer, "clip_model", None)
+    monkeypatch.setattr(openai.embeddings, "create", _no_api)
+    return CoherenceScorer()
+
+def test_embed_texts_dedupes_and_restores_order(monkeypatch):
+    s = make_scorer(monkeypatch)
+    embs = s.embed_texts(["a", "b", "a"])
+    assert embs.shape == (3, 1536)
+    assert np.array_equal(embs[0], embs[2])
+    assert not np.array_equal(embs[0], embs[1])
+    assert np.allclose(np.linalg.norm(embs, axis=1), 1.0, atol=1e-5)
+
+def test_score_matrix_shape_and_range(monkeypatch):
+    s = make_scorer(monkeypatch)
+    scores = s.score_matrix(["a", "b", "a"], ["x.png", "y.png"])
+    assert scores.shape == (3, 2)
+    assert ((scores >= 0.0) & (scores <= 1.0)).all()
+    assert np.array_equal(scores[0], scores[2])
+
+def test_score_matrix_neutralizes_failed_images(monkeypatch):
+    s = make_scorer(monkeypatch)
+    captions = s.embed_texts(["c1", "c2"])
+    monkeypatch.setattr(s, "embed_images", lambda paths: (captions, np.array([True, False])))
+    scores = s.score_matrix(["a", "b"], ["ok.png", ""])
+    assert (scores[:, 1] == 0.4).all()
+    assert np.allclose(scores[:, 0], (s.embed_texts(["a", "b"]) @ captions[0] + 1.0) / 2.0)